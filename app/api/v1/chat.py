@@ -7,7 +7,7 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.connection import get_db
+from app.database.connection import get_db, get_db_ro
 from app.services.orchestrator.agent_coordinator import agent_coordinator
 from app.services.orchestrator.session_manager import SessionManager
 from app.repositories.chat_history_repo import ChatHistoryRepository
@@ -113,7 +113,7 @@ async def get_chat_history(
     session_id: str,
     limit: int = 50,
     before_message_id: Optional[int] = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ) -> ChatHistoryResponse:
     """获取聊天历史"""
     try:
@@ -3,6 +3,7 @@
 """
 
 import uuid
+from secrets import token_hex
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -84,7 +85,7 @@ async def check_grammar(
         # 为缺少 id 的错误生成唯一 ID
         for i, error in enumerate(errors):
             if "id" not in error or not error.get("id"):
-                error["id"] = f"err_{uuid.uuid4().hex[:8]}_{i}"
+                error["id"] = f"err_{token_hex(4)}_{i}"
 
         # 获取内容版本和哈希
         import hashlib
@@ -106,6 +107,8 @@ async def check_grammar(
             tokens_used=result.metadata.get("tokens_used", 0),
             model_used=result.metadata.get("model", "")
         )
+        # 返回响应前提交写入
+        await db.commit()
 
         return GrammarCheckResponse(
             errors=errors,
@@ -403,6 +406,9 @@ async def analyze_structure(
                     nodes=nodes
                 )
 
+        # 返回响应前提交写入
+        await db.commit()
+
         logger.info(f"结构分析成功: session={request.session_id}")
 
         return StructureAnalyzeResponse(**result.data)
@@ -493,6 +499,8 @@ async def analyze_health(
             tokens_used=result.metadata.get("tokens_used", 0),
             model_used=result.metadata.get("model", "")
         )
+        # 返回响应前提交写入
+        await db.commit()
 
         logger.info(
             f"健康度评估成功: session={request.session_id}, "
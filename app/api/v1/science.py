@@ -6,7 +6,7 @@ import uuid
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.connection import get_db
+from app.database.connection import get_db, get_db_ro
 from app.services.orchestrator.agent_coordinator import agent_coordinator
 from app.services.orchestrator.session_manager import SessionManager
 from app.repositories.analysis_repo import AnalysisRepository
@@ -74,9 +74,11 @@ async def validate_steps(
         # 保存数学步骤
         analysis_repo = AnalysisRepository(db)
         if result.data.get("validation_results"):
+            # 每次验证保存为新的内容版本
+            content_version = await analysis_repo.next_math_steps_version(request.session_id)
             await analysis_repo.save_math_steps(
                 session_id=request.session_id,
-                content_version=1,
+                content_version=content_version,
                 steps=[
                     {
                         "step_number": v.get("step_number", 0),
@@ -95,6 +97,8 @@ async def validate_steps(
                     for i, v in enumerate(result.data["validation_results"])
                 ]
             )
+            # 返回响应前提交写入
+            await db.commit()
 
         return ValidateStepsResponse(**result.data)
 
@@ -143,11 +147,15 @@ async def build_logic_tree(
         # 保存逻辑树节点
         analysis_repo = AnalysisRepository(db)
         if result.data.get("logic_tree", {}).get("nodes"):
+            # 每次构建保存为新的内容版本
+            content_version = await analysis_repo.next_logic_tree_version(request.session_id)
             await analysis_repo.save_logic_tree_nodes(
                 session_id=request.session_id,
-                content_version=1,
+                content_version=content_version,
                 nodes=result.data["logic_tree"]["nodes"]
             )
+            # 返回响应前提交写入
+            await db.commit()
 
         return LogicTreeResponse(**result.data)
 
@@ -169,13 +177,14 @@ async def build_logic_tree(
 )
 async def get_logic_tree(
     session_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ) -> LogicTreeResponse:
     """获取逻辑树"""
     try:
-        # 获取逻辑树节点
+        # 获取最新一次构建的逻辑树节点
         analysis_repo = AnalysisRepository(db)
-        nodes = await analysis_repo.get_logic_tree_nodes(session_id)
+        content_version = await analysis_repo.get_latest_logic_tree_version(session_id)
+        nodes = await analysis_repo.get_logic_tree_nodes(session_id, content_version)
 
         if not nodes:
             raise HTTPException(
@@ -368,6 +377,8 @@ async def debug_steps(
             warnings=result.data.get("warnings", []),
             next_actions=result.data.get("next_possible_actions", [])
         )
+        # 返回响应前提交写入
+        await db.commit()
 
         logger.info(
             f"断点调试成功: session={request.session_id}, "
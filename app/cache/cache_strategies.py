@@ -38,6 +38,11 @@ class CacheKeyBuilder:
         """分析结果缓存键"""
         return f"analysis:{analysis_type}:{content_hash}"
 
+    @staticmethod
+    def analysis_record(session_id: str, analysis_type: str, content_hash: str) -> str:
+        """会话分析结果记录缓存键"""
+        return f"session:{session_id}:analysis:{analysis_type}:{content_hash}"
+
     @staticmethod
     def session_annotations(session_id: str) -> str:
         """会话错误标注键"""
@@ -259,6 +264,65 @@ class AnalysisCache:
         return cache_data
 
 
+class AnalysisRecordCache:
+    """
+    分析结果记录缓存管理
+
+    缓存 literature_analysis 表的整行数据，键与数据库唯一索引
+    (session_id, analysis_type, content_hash) 一一对应
+    """
+
+    def __init__(self) -> None:
+        self.cache = redis_cache
+        self.key_builder = CacheKeyBuilder()
+
+    async def get_record(
+        self,
+        session_id: str,
+        analysis_type: str,
+        content_hash: str
+    ) -> Optional[Dict[str, Any]]:
+        """获取缓存的分析结果记录"""
+        key = self.key_builder.analysis_record(session_id, analysis_type, content_hash)
+        return await self.cache.get_json(key)
+
+    async def set_record(
+        self,
+        record: Dict[str, Any],
+        ttl: Optional[int] = None
+    ) -> bool:
+        """
+        缓存分析结果记录
+
+        Args:
+            record: 记录数据，需包含 session_id、analysis_type、content_hash
+            ttl: 过期时间（秒）
+
+        Returns:
+            是否设置成功
+        """
+        key = self.key_builder.analysis_record(
+            record["session_id"], record["analysis_type"], record["content_hash"]
+        )
+        ttl = ttl or settings.analysis_record_cache_ttl
+        return await self.cache.set_json(key, record, ttl=ttl)
+
+    async def delete_record(
+        self,
+        session_id: str,
+        analysis_type: str,
+        content_hash: str
+    ) -> bool:
+        """删除缓存的分析结果记录"""
+        key = self.key_builder.analysis_record(session_id, analysis_type, content_hash)
+        return await self.cache.delete(key)
+
+    async def delete_session_records(self, session_id: str) -> int:
+        """删除会话的所有分析结果记录缓存"""
+        pattern = f"session:{session_id}:analysis:*"
+        return await self.cache.delete_pattern(pattern)
+
+
 class ChatContextCache:
     """对话上下文缓存管理"""
 
@@ -456,6 +520,7 @@ class RateLimiter:
 # 创建全局缓存管理器实例
 session_cache = SessionCache()
 analysis_cache = AnalysisCache()
+analysis_record_cache = AnalysisRecordCache()
 chat_context_cache = ChatContextCache()
 agent_lock_manager = AgentLockManager()
 rate_limiter = RateLimiter()
@@ -3,6 +3,7 @@
 使用 Pydantic Settings 进行配置管理和验证
 """
 
+from functools import cache
 from typing import List, Optional, Union
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -35,7 +36,16 @@ class Settings(BaseSettings):
         description="数据库连接URL"
     )
     database_pool_size: int = Field(default=20, description="数据库连接池大小")
-    database_max_overflow: int = Field(default=10, description="数据库连接池最大溢出")
+    database_max_overflow: int = Field(default=40, description="数据库连接池最大溢出")
+    database_pool_timeout: int = Field(default=10, description="获取数据库连接的超时时间(秒)")
+    database_pool_use_lifo: bool = Field(default=True, description="连接池是否优先复用最近归还的连接")
+    database_pool_recycle: int = Field(default=3600, description="数据库连接最长复用时间(秒)")
+    database_pool_idle_timeout: int = Field(
+        default=600,
+        description="连接池完全空闲多久后主动关闭空闲连接(秒)，0表示不启用"
+    )
+    database_application_name: str = Field(default="tew-axiom", description="数据库连接的application_name")
+    use_pgbouncer: bool = Field(default=False, description="数据库前是否部署了PgBouncer(事务池模式)")
 
     # Redis配置
     redis_url: str = Field(default="redis://localhost:6379/0", description="Redis连接URL")
@@ -138,6 +148,8 @@ class Settings(BaseSettings):
     # 缓存配置
     cache_ttl_seconds: int = Field(default=3600, description="缓存TTL(秒)")
     analysis_cache_ttl: int = Field(default=3600, description="分析结果缓存TTL(秒)")
+    analysis_record_cache_ttl: int = Field(default=900, description="分析结果记录缓存TTL(秒)")
+    analysis_hit_flush_interval_ms: int = Field(default=500, description="缓存命中次数批量写入间隔(毫秒)")
 
     # Agent配置
     agent_timeout_seconds: int = Field(default=30, description="Agent超时时间(秒)")
@@ -146,6 +158,8 @@ class Settings(BaseSettings):
 
     # 文件上传配置
     max_upload_size_mb: int = Field(default=10, description="最大上传文件大小(MB)")
+    max_request_body_kb: int = Field(default=500, description="最大请求体大小(KB)，不含文件上传")
+    max_content_chars: int = Field(default=50000, description="单次分析支持的最大内容字符数")
     allowed_image_types: List[str] = Field(
         default=["image/jpeg", "image/png", "image/jpg"],
         description="允许的图片类型"
@@ -190,5 +204,29 @@ class Settings(BaseSettings):
         return self.max_upload_size_mb * 1024 * 1024
 
 
+@cache
+def normalize_async_db_url(url: str) -> str:
+    """
+    规范化数据库URL，确保使用 asyncpg 驱动
+
+    Args:
+        url: 数据库连接URL，支持 postgresql:// 和 postgres:// 前缀
+
+    Returns:
+        postgresql+asyncpg:// 前缀的数据库URL
+
+    Raises:
+        ValueError: URL 不是 PostgreSQL 连接地址
+    """
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    elif url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql+asyncpg://", 1)
+
+    if not url.startswith("postgresql+asyncpg://"):
+        raise ValueError("database_url 必须是 PostgreSQL 连接地址，并使用 asyncpg 驱动")
+    return url
+
+
 # 创建全局配置实例
 settings = Settings()
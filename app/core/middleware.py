@@ -0,0 +1,96 @@
+"""
+HTTP中间件
+包括请求体大小限制等
+"""
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class ContentSizeLimitMiddleware:
+    """
+    请求体大小限制中间件
+
+    在解析JSON之前拒绝超过限制的请求体：声明了Content-Length的请求直接返回413，
+    未声明长度（分块传输）的请求先读取请求体，超出限制时返回413，否则交给应用处理。
+    文件上传（multipart/form-data）使用单独的上限。
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, max_multipart_size: int) -> None:
+        """
+        初始化中间件
+
+        Args:
+            app: ASGI应用
+            max_body_size: 请求体最大字节数
+            max_multipart_size: 文件上传请求体最大字节数
+        """
+        self.app = app
+        self.max_body_size = max_body_size
+        self.max_multipart_size = max_multipart_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get("content-type", "").startswith("multipart/form-data"):
+            limit = self.max_multipart_size
+        else:
+            limit = self.max_body_size
+
+        content_length = headers.get("content-length")
+        if content_length is not None and content_length.isdigit():
+            if int(content_length) > limit:
+                response = self._too_large_response(limit, int(content_length))
+                await response(scope, receive, send)
+                return
+
+            await self.app(scope, receive, send)
+            return
+
+        # 未声明长度时先读取请求体，超出限制立即停止读取
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                # 客户端已断开
+                return
+            body.extend(message.get("body", b""))
+            more_body = message.get("more_body", False)
+            if len(body) > limit:
+                response = self._too_large_response(limit, len(body))
+                await response(scope, receive, send)
+                return
+
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": bytes(body), "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay_receive, send)
+
+    @staticmethod
+    def _too_large_response(limit: int, actual_size: int) -> JSONResponse:
+        """构建请求体过大的错误响应，格式与全局异常处理一致"""
+        return JSONResponse(
+            status_code=413,
+            content={
+                "error": {
+                    "code": "CONTENT_TOO_LONG",
+                    "message": f"请求体过大 (最大: {limit}, 实际: {actual_size})",
+                    "details": {
+                        "max_length": limit,
+                        "actual_length": actual_size
+                    }
+                }
+            }
+        )
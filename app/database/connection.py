@@ -3,18 +3,23 @@
 提供异步数据库连接和会话管理
 """
 
+import asyncio
+import time
+import weakref
+from functools import cache
 from typing import AsyncGenerator
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     AsyncEngine,
     create_async_engine,
     async_sessionmaker
 )
-from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
-from sqlalchemy import text
+from sqlalchemy.orm import declarative_base, Session, ORMExecuteState
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool, QueuePool, ConnectionPoolEntry
+from sqlalchemy import event, text
 
-from app.config import settings
+from app.config import settings, normalize_async_db_url
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
@@ -22,51 +27,117 @@ logger = get_logger(__name__)
 # 创建基类
 Base = declarative_base()
 
-# 全局引擎和会话工厂
-_engine: AsyncEngine | None = None
-_async_session_factory: async_sessionmaker[AsyncSession] | None = None
+# 会话info中记录当前事务是否有写操作的键
+_HAS_WRITES = "has_writes"
 
+# 连接池中的空闲连接及其归还时间（time.monotonic），连接被取出时移除
+_idle_connections: "weakref.WeakKeyDictionary[ConnectionPoolEntry, float]" = weakref.WeakKeyDictionary()
 
-def get_engine() -> AsyncEngine:
+# 空闲连接回收任务
+_idle_reaper_task: asyncio.Task | None = None
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush_writes(session: Session, flush_context) -> None:
+    """ORM flush 后标记当前事务存在写操作"""
+    session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml_writes(orm_execute_state: ORMExecuteState) -> None:
+    """通过 session.execute() 执行 INSERT/UPDATE/DELETE 时标记写操作"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_writes(session: Session, transaction) -> None:
     """
-    获取数据库引擎
+    事务结束后清除写操作标记
 
-    Returns:
-        数据库引擎
+    保存点提交或回滚同样会触发提交/回滚事件，只在最外层事务结束时清除，
+    否则保存点内的写入会被误判为没有写操作而在 get_db 中回滚
+    """
+    if transaction.parent is None:
+        session.info.pop(_HAS_WRITES, None)
+
+
+def get_pool_limits() -> tuple[int, int]:
     """
-    global _engine
+    获取连接池大小和最大溢出数
 
-    if _engine is None:
-        # 确保使用 asyncpg 驱动
-        database_url = settings.database_url
-        if database_url.startswith("postgresql://"):
-            database_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-        elif database_url.startswith("postgres://"):
-            database_url = database_url.replace("postgres://", "postgresql+asyncpg://", 1)
+    Returns:
+        (连接池大小, 最大溢出数)，开发环境使用小连接池
+    """
+    if settings.is_development:
+        return 2, 5
+    return settings.database_pool_size, settings.database_max_overflow
 
-        # 根据环境选择连接池策略
-        engine_kwargs = {
-            "echo": settings.debug,
-            "pool_pre_ping": True,  # 连接前检查连接是否有效
-        }
 
-        if settings.is_development:
-            # 开发环境不使用连接池
-            engine_kwargs["poolclass"] = NullPool
-        else:
-            # 生产环境使用异步连接池
-            engine_kwargs["poolclass"] = AsyncAdaptedQueuePool
-            engine_kwargs["pool_size"] = settings.database_pool_size
-            engine_kwargs["max_overflow"] = settings.database_max_overflow
-            engine_kwargs["pool_recycle"] = 3600  # 1小时回收连接
+def _record_pool_checkin(dbapi_connection, connection_record) -> None:
+    """记录连接归还时间，供空闲连接回收任务判断连接空闲时长"""
+    _idle_connections[connection_record] = time.monotonic()
 
-        _engine = create_async_engine(database_url, **engine_kwargs)
 
-        logger.info(f"数据库引擎已创建: {database_url.split('@')[1] if '@' in database_url else 'local'}")
+def _record_pool_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    """连接被取出后不再视为空闲"""
+    _idle_connections.pop(connection_record, None)
 
-    return _engine
 
+@cache
+def get_engine() -> AsyncEngine:
+    """
+    获取数据库引擎（进程内只创建一次）
 
+    Returns:
+        数据库引擎
+    """
+    # 确保使用 asyncpg 驱动
+    database_url = normalize_async_db_url(settings.database_url)
+
+    server_settings = {"application_name": settings.database_application_name}
+    connect_args = {"server_settings": server_settings}
+    if settings.use_pgbouncer:
+        # PgBouncer会拒绝不认识的启动参数，jit需在服务端通过
+        # ALTER ROLE/DATABASE ... SET jit = off 关闭
+        # 事务池模式下服务端预处理语句无法跨事务复用，且语句名需全局唯一以免冲突
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    else:
+        server_settings["jit"] = "off"  # 短查询为主，JIT编译开销大于收益
+
+    # 根据环境选择连接池策略
+    engine_kwargs = {
+        "echo": settings.debug,
+        "pool_pre_ping": True,  # 连接前检查连接是否有效
+        "connect_args": connect_args,
+    }
+
+    if settings.use_pgbouncer:
+        # 由PgBouncer负责连接池，应用侧再维护连接池会相互冲突
+        engine_kwargs["poolclass"] = NullPool
+    else:
+        # 使用异步连接池，开发环境使用小连接池
+        engine_kwargs["poolclass"] = AsyncAdaptedQueuePool
+        pool_size, max_overflow = get_pool_limits()
+        engine_kwargs["pool_size"] = pool_size
+        engine_kwargs["max_overflow"] = max_overflow
+        engine_kwargs["pool_recycle"] = settings.database_pool_recycle
+        engine_kwargs["pool_timeout"] = settings.database_pool_timeout
+        engine_kwargs["pool_use_lifo"] = settings.database_pool_use_lifo  # 热连接优先复用
+        engine_kwargs["pool_reset_on_return"] = "rollback"
+
+    engine = create_async_engine(database_url, **engine_kwargs)
+    event.listen(engine.sync_engine, "checkin", _record_pool_checkin)
+    event.listen(engine.sync_engine, "checkout", _record_pool_checkout)
+
+    logger.info(f"数据库引擎已创建: {database_url.split('@')[1] if '@' in database_url else 'local'}")
+
+    return engine
+
+
+@cache
 def get_session_factory() -> async_sessionmaker[AsyncSession]:
     """
     获取会话工厂
@@ -74,27 +145,62 @@ def get_session_factory() -> async_sessionmaker[AsyncSession]:
     Returns:
         会话工厂
     """
-    global _async_session_factory
+    session_factory = async_sessionmaker(
+        get_engine(),
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
 
-    if _async_session_factory is None:
-        engine = get_engine()
-        _async_session_factory = async_sessionmaker(
-            engine,
-            class_=AsyncSession,
-            expire_on_commit=False,
-            autocommit=False,
-            autoflush=False,
-        )
+    logger.info("数据库会话工厂已创建")
+
+    return session_factory
+
+
+@cache
+def get_readonly_session_factory() -> async_sessionmaker[AsyncSession]:
+    """
+    获取只读会话工厂
 
-        logger.info("数据库会话工厂已创建")
+    与读写会话共用同一连接池，但连接以 AUTOCOMMIT 模式执行，
+    查询不再包裹 BEGIN/COMMIT。
 
-    return _async_session_factory
+    Returns:
+        只读会话工厂
+    """
+    session_factory = async_sessionmaker(
+        get_engine().execution_options(isolation_level="AUTOCOMMIT"),
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+    logger.info("只读数据库会话工厂已创建")
+
+    return session_factory
+
+
+def _has_pending_writes(session: AsyncSession) -> bool:
+    """当前事务是否包含尚未提交的写操作"""
+    return bool(
+        session.new
+        or session.dirty
+        or session.deleted
+        or session.info.get(_HAS_WRITES)
+    )
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     获取数据库会话（依赖注入）
 
+    仅在事务中存在写操作时提交，纯读取的请求直接回滚，
+    未开启事务的会话不发送任何事务语句。
+
+    依赖的清理代码在响应发送之后才执行，写接口应在返回前自行提交，
+    这里的提交只作为兜底。
+
     Yields:
         数据库会话
     """
@@ -102,7 +208,31 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with session_factory() as session:
         try:
             yield session
-            await session.commit()
+            if session.in_transaction():
+                if _has_pending_writes(session):
+                    await session.commit()
+                else:
+                    await session.rollback()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+async def get_db_ro() -> AsyncGenerator[AsyncSession, None]:
+    """
+    获取只读数据库会话（依赖注入）
+
+    用于只执行查询的接口，会话从不提交。
+
+    Yields:
+        数据库会话
+    """
+    session_factory = get_readonly_session_factory()
+    async with session_factory() as session:
+        try:
+            yield session
         except Exception:
             await session.rollback()
             raise
@@ -127,16 +257,80 @@ async def init_db() -> None:
     logger.info("数据库表已创建")
 
 
+async def _idle_reaper(idle_timeout: int) -> None:
+    """
+    空闲连接回收循环
+
+    SQLAlchemy 只在连接被取出时才检查是否需要回收，而连接池按LIFO取用连接，
+    突发流量过后即使仍有少量请求，池底的空闲连接也不会再被取出，会一直占用
+    数据库后端进程。这里定期关闭归还后超过 idle_timeout 秒未被取出的连接，
+    连接记录仍留在池中，下次取出时重新建立连接。
+
+    Args:
+        idle_timeout: 空闲超时时间（秒）
+    """
+    interval = max(1, idle_timeout // 2)
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            now = time.monotonic()
+            stale = []
+            for record, checked_in_at in list(_idle_connections.items()):
+                if record.in_use:
+                    # 已从池中取出、正在预检（pre-ping）的连接，checkout事件尚未触发
+                    _idle_connections.pop(record, None)
+                elif now - checked_in_at >= idle_timeout and record.dbapi_connection is not None:
+                    stale.append(record)
+
+            # 检查与关闭之间没有await，留在池中未被取出的连接不会在此期间被取用；
+            # asyncpg 连接失效时直接终止，不需要 await
+            for record in stale:
+                _idle_connections.pop(record, None)
+                record.invalidate()
+
+            if stale:
+                logger.info(f"已关闭空闲数据库连接: {len(stale)}个")
+        except Exception as e:
+            logger.warning(f"空闲数据库连接回收失败: {str(e)}")
+
+
+def start_idle_reaper() -> None:
+    """
+    启动空闲连接回收任务
+
+    仅在使用应用侧连接池时启用，需要在事件循环中调用
+    """
+    global _idle_reaper_task
+
+    if _idle_reaper_task is not None or settings.database_pool_idle_timeout <= 0:
+        return
+
+    engine = get_engine()
+    if not isinstance(engine.sync_engine.pool, QueuePool):
+        return
+
+    _idle_reaper_task = asyncio.create_task(
+        _idle_reaper(settings.database_pool_idle_timeout)
+    )
+    logger.info("空闲数据库连接回收任务已启动")
+
+
 async def close_db() -> None:
     """
     关闭数据库连接
     """
-    global _engine, _async_session_factory
+    global _idle_reaper_task
+
+    if _idle_reaper_task is not None:
+        _idle_reaper_task.cancel()
+        _idle_reaper_task = None
 
-    if _engine is not None:
-        await _engine.dispose()
-        _engine = None
-        _async_session_factory = None
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+        get_engine.cache_clear()
+        get_session_factory.cache_clear()
+        get_readonly_session_factory.cache_clear()
         logger.info("数据库连接已关闭")
 
 
@@ -8,7 +8,7 @@ from alembic import context
 import asyncio
 from sqlalchemy.ext.asyncio import create_async_engine
 
-from app.config import settings
+from app.config import settings, normalize_async_db_url
 from app.database.connection import Base
 from app.database.models import *  # 导入所有模型
 
@@ -16,12 +16,7 @@ from app.database.models import *  # 导入所有模型
 config = context.config
 
 # 设置数据库URL（确保使用asyncpg驱动）
-database_url = settings.database_url
-# 确保 URL 使用 postgresql+asyncpg:// 而不是 postgresql://
-if database_url.startswith("postgresql://"):
-    database_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-elif database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql+asyncpg://", 1)
+database_url = normalize_async_db_url(settings.database_url)
 
 config.set_main_option("sqlalchemy.url", database_url)
 
@@ -61,13 +56,6 @@ async def run_migrations_online() -> None:
     """
     在线模式运行迁移
     """
-    # 确保使用 asyncpg 驱动
-    database_url = settings.database_url
-    if database_url.startswith("postgresql://"):
-        database_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-    elif database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql+asyncpg://", 1)
-
     connectable = create_async_engine(
         database_url,
         poolclass=pool.NullPool,
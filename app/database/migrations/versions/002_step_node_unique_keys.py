@@ -0,0 +1,115 @@
+"""
+为数学步骤和逻辑树节点添加唯一键
+同一会话、同一内容版本内的步骤顺序和节点ID不再重复
+
+Revision ID: 002_step_node_unique_keys
+Revises: 001_initial
+Create Date: 2026-10-14 00:00:00.000000
+"""
+from typing import List, Tuple
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '002_step_node_unique_keys'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+# 早期版本保存逻辑树节点时未写入节点ID，回填为该前缀加主键
+LEGACY_NODE_ID_PREFIX = '__legacy_'
+
+
+def _backup_table(table: str) -> str:
+    """重复记录备份表名"""
+    return f"{table}_duplicates_002"
+
+
+def _dedupe(table: str, key_columns: List[str], references: List[Tuple[str, str]]) -> None:
+    """
+    清理唯一键重复的记录，每组保留最新（id最大）的一条
+
+    被清理的记录先复制到备份表，降级时恢复
+
+    Args:
+        table: 表名
+        key_columns: 唯一键字段
+        references: 引用该表id的(表名, 字段名)列表，清理前改为引用保留的记录
+    """
+    ranked = (
+        f"SELECT id, max(id) OVER (PARTITION BY {', '.join(key_columns)}) AS keep_id "
+        f"FROM {table}"
+    )
+
+    op.execute(
+        f"CREATE TABLE {_backup_table(table)} AS "
+        f"WITH ranked AS ({ranked}) "
+        f"SELECT {table}.* FROM {table} JOIN ranked ON {table}.id = ranked.id "
+        f"WHERE ranked.id <> ranked.keep_id"
+    )
+
+    for ref_table, ref_column in references:
+        op.execute(
+            f"WITH ranked AS ({ranked}) "
+            f"UPDATE {ref_table} SET {ref_column} = ranked.keep_id FROM ranked "
+            f"WHERE {ref_table}.{ref_column} = ranked.id AND ranked.id <> ranked.keep_id"
+        )
+
+    op.execute(
+        f"WITH ranked AS ({ranked}) "
+        f"DELETE FROM {table} USING ranked "
+        f"WHERE {table}.id = ranked.id AND ranked.id <> ranked.keep_id"
+    )
+
+
+def _restore(table: str) -> None:
+    """从备份表恢复被清理的重复记录"""
+    op.execute(f"INSERT INTO {table} SELECT * FROM {_backup_table(table)}")
+    op.execute(f"DROP TABLE {_backup_table(table)}")
+
+
+def upgrade() -> None:
+    """清理重复记录并创建唯一索引"""
+
+    # 数学步骤表
+    _dedupe(
+        'math_steps',
+        ['session_id', 'content_version', 'step_order'],
+        [('math_steps', 'parent_step_id'), ('debug_sessions', 'breakpoint_step_id')]
+    )
+    op.create_index(
+        'idx_math_steps_step_key',
+        'math_steps',
+        ['session_id', 'content_version', 'step_order'],
+        unique=True
+    )
+
+    # 逻辑树节点表：先回填缺失的节点ID，避免同一棵树的节点被当作重复记录
+    op.execute(
+        f"UPDATE logic_tree_nodes SET node_id = '{LEGACY_NODE_ID_PREFIX}' || id "
+        f"WHERE node_id = ''"
+    )
+    _dedupe(
+        'logic_tree_nodes',
+        ['session_id', 'content_version', 'node_id'],
+        [('logic_tree_nodes', 'parent_id')]
+    )
+    op.create_index(
+        'idx_logic_tree_nodes_node_key',
+        'logic_tree_nodes',
+        ['session_id', 'content_version', 'node_id'],
+        unique=True
+    )
+
+
+def downgrade() -> None:
+    """删除唯一索引，恢复被清理的重复记录和回填前的节点ID"""
+    op.drop_index('idx_logic_tree_nodes_node_key', table_name='logic_tree_nodes')
+    op.drop_index('idx_math_steps_step_key', table_name='math_steps')
+
+    _restore('logic_tree_nodes')
+    op.execute(
+        f"UPDATE logic_tree_nodes SET node_id = '' "
+        f"WHERE node_id = '{LEGACY_NODE_ID_PREFIX}' || id"
+    )
+    _restore('math_steps')
@@ -287,6 +287,7 @@ class MathStep(Base):
 
     __table_args__ = (
         Index('idx_session_steps', 'session_id', 'step_order'),
+        Index('idx_step_key', 'session_id', 'content_version', 'step_order', unique=True),
     )
 
 
@@ -335,6 +336,7 @@ class LogicTreeNode(Base):
         CheckConstraint("status IN ('complete', 'incomplete', 'missing', 'invalid')", name='check_status'),
         Index('idx_session_tree', 'session_id', 'content_version'),
         Index('idx_node_id', 'session_id', 'node_id'),
+        Index('idx_node_key', 'session_id', 'content_version', 'node_id', unique=True),
         Index('idx_node_type_status', 'node_type', 'status'),
     )
 
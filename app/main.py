@@ -11,8 +11,10 @@ from fastapi.responses import JSONResponse
 from app.config import settings
 from app.core.logging import logger
 from app.core.exceptions import BaseAppException
-from app.database.connection import init_db, close_db, check_db_connection
+from app.core.middleware import ContentSizeLimitMiddleware
+from app.database.connection import init_db, close_db, check_db_connection, start_idle_reaper
 from app.cache.redis_client import check_redis_connection, close_redis
+from app.repositories.analysis_repo import start_cache_hit_flusher, stop_cache_hit_flusher
 
 # 导入路由
 from app.api.v1 import session, literature, science, chat, ocr, feedback, system
@@ -33,6 +35,12 @@ async def lifespan(app: FastAPI):
     else:
         logger.error("✗ 数据库连接失败")
 
+    # 启动空闲数据库连接回收
+    start_idle_reaper()
+
+    # 启动缓存命中次数批量写入
+    start_cache_hit_flusher()
+
     # 检查Redis连接
     redis_ok = await check_redis_connection()
     if redis_ok:
@@ -50,6 +58,7 @@ async def lifespan(app: FastAPI):
 
     # 关闭时执行
     logger.info("关闭应用...")
+    await stop_cache_hit_flusher()
     await close_db()
     await close_redis()
     logger.info("应用已关闭")
@@ -87,6 +96,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 请求体大小限制（在CORS之前注册，使413响应同样带有CORS头）
+app.add_middleware(
+    ContentSizeLimitMiddleware,
+    max_body_size=settings.max_request_body_kb * 1024,
+    # 文件上传另留64KB给表单字段和分隔符
+    max_multipart_size=settings.max_upload_size_mb * 1024 * 1024 + 64 * 1024,
+)
+
 # CORS配置
 app.add_middleware(
     CORSMiddleware,
@@ -205,7 +222,7 @@ async def get_capabilities():
             }
         ],
         "limits": {
-            "max_content_length": 50000,
+            "max_content_length": settings.max_content_chars,
             "max_file_size_mb": 10,
             "rate_limit_per_minute": settings.rate_limit_per_minute
         }
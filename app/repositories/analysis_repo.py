@@ -3,20 +3,292 @@
 负责文科和理科分析结果的数据访问
 """
 
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+import asyncio
+import uuid
+from collections import Counter
+from functools import wraps
+from typing import Optional, List, Dict, Set, Any, AsyncIterator, Awaitable, Callable
+from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import (
+    BigInteger, Integer, Select, select, update, values, column, func, text, case, and_, or_, tuple_,
+    event
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.config import settings
+from app.cache.cache_strategies import analysis_record_cache
+from app.database.connection import get_pool_limits, get_session_factory
 from app.database.models import LiteratureAnalysis, MathStep, LogicTreeNode, DebugSession
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+_LITERATURE_ANALYSIS_COLUMNS = tuple(LiteratureAnalysis.__table__.columns.keys())
+
+# 批量创建时与已过期记录冲突，需要用新结果替换的字段
+_REFRESHED_ON_EXPIRY = (
+    "content_version", "results", "processing_time_ms", "tokens_used",
+    "model_used", "is_cached", "expires_at", "created_at"
+)
+
+# 限制并发写事务数量，避免耗尽连接池（首次使用时创建）
+_write_semaphore: Optional[asyncio.Semaphore] = None
+
+# 会话info中标记该会话已持有写操作名额的键
+_WRITE_SLOT = "analysis_write_slot"
+
+
+def _get_write_semaphore() -> asyncio.Semaphore:
+    """获取写操作信号量，容量为连接池总容量减去为读操作预留的2个连接"""
+    global _write_semaphore
+
+    if _write_semaphore is None:
+        pool_size, max_overflow = get_pool_limits()
+        _write_semaphore = asyncio.Semaphore(max(1, pool_size + max_overflow - 2))
+
+    return _write_semaphore
+
+
+async def _acquire_write_slot(session: AsyncSession) -> None:
+    """
+    为会话获取写操作名额
+
+    写入只flush不commit，连接要到事务结束才归还连接池，因此名额由会话持有到
+    事务结束；同一会话重复获取时直接返回（信号量不可重入）
+    """
+    if session.info.get(_WRITE_SLOT):
+        return
+
+    await _get_write_semaphore().acquire()
+    session.info[_WRITE_SLOT] = True
+
+
+def _release_write_slot(session: Session) -> None:
+    """释放会话持有的写操作名额"""
+    if session.info.pop(_WRITE_SLOT, False):
+        _get_write_semaphore().release()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_write_slot_on_end(session: Session, transaction) -> None:
+    """事务提交或回滚、连接归还连接池后释放写操作名额"""
+    if transaction.parent is None:
+        _release_write_slot(session)
+
+
+def _bounded_write(func):
+    """
+    限制并发写事务的装饰器
+
+    Args:
+        func: 要限制的异步写方法
+
+    Returns:
+        装饰后的函数
+    """
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        await _acquire_write_slot(self.db)
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            # 未开启事务（如参数校验失败）时不会触发事务结束事件，立即释放
+            if not self.db.in_transaction():
+                _release_write_slot(self.db.sync_session)
+
+    return wrapper
+
+
+# 待写入数据库的缓存命中次数增量：分析结果ID -> 增量
+_pending_cache_hits: Counter = Counter()
+# 待写入增量对应的缓存键：分析结果ID -> (会话ID, 分析类型, 内容哈希)
+_cache_hit_keys: Dict[int, tuple] = {}
+_cache_hit_flush_lock = asyncio.Lock()
+_cache_hit_flusher_task: Optional[asyncio.Task] = None
+
+
+async def flush_cache_hits() -> int:
+    """
+    将累积的缓存命中次数增量批量写入数据库
+
+    所有增量合并为一条 UPDATE ... FROM (VALUES ...) 语句；写入失败或任务被取消时
+    增量会放回队列，等待下次写入。未匹配到的记录已被删除，同时清除其缓存，
+    避免已删除的分析结果继续从缓存返回
+
+    Returns:
+        写入的分析结果数量
+    """
+    global _pending_cache_hits, _cache_hit_keys
+
+    async with _cache_hit_flush_lock:
+        if not _pending_cache_hits:
+            return 0
+
+        pending, _pending_cache_hits = _pending_cache_hits, Counter()
+        keys, _cache_hit_keys = _cache_hit_keys, {}
+
+        deltas = values(
+            column("id", BigInteger),
+            column("delta", Integer),
+            name="hit_deltas"
+        ).data(list(pending.items()))
+        stmt = (
+            update(LiteratureAnalysis)
+            .where(LiteratureAnalysis.id == deltas.c.id)
+            .values(cache_hit_count=LiteratureAnalysis.cache_hit_count + deltas.c.delta)
+            .returning(LiteratureAnalysis.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        written = False
+        try:
+            async with get_session_factory()() as session:
+                result = await session.execute(stmt)
+                matched = set(result.scalars().all())
+                await session.commit()
+            written = True
+        except Exception as e:
+            logger.warning(f"写入缓存命中次数失败: {str(e)}")
+            return 0
+        finally:
+            if not written:
+                _pending_cache_hits.update(pending)
+                for analysis_id, key in keys.items():
+                    _cache_hit_keys.setdefault(analysis_id, key)
+
+        for analysis_id in pending.keys() - matched:
+            if analysis_id not in keys:
+                continue
+            try:
+                await analysis_record_cache.delete_record(*keys[analysis_id])
+            except Exception as e:
+                logger.warning(f"删除分析结果缓存失败: {str(e)}")
+
+        logger.debug(f"写入缓存命中次数: {len(pending)}条记录, 共{sum(pending.values())}次")
+        return len(pending)
+
+
+async def _cache_hit_flusher(interval: float) -> None:
+    """定期写入缓存命中次数"""
+    while True:
+        await asyncio.sleep(interval)
+        await flush_cache_hits()
+
+
+def start_cache_hit_flusher() -> None:
+    """启动缓存命中次数写入任务，需要在事件循环中调用"""
+    global _cache_hit_flusher_task
+
+    if _cache_hit_flusher_task is None:
+        interval = settings.analysis_hit_flush_interval_ms / 1000
+        _cache_hit_flusher_task = asyncio.create_task(_cache_hit_flusher(interval))
+        logger.info("缓存命中次数写入任务已启动")
+
+
+async def stop_cache_hit_flusher() -> None:
+    """停止缓存命中次数写入任务，并写入剩余的增量"""
+    global _cache_hit_flusher_task
+
+    task, _cache_hit_flusher_task = _cache_hit_flusher_task, None
+    if task is not None:
+        # 等待任务退出；取消时正在写入的增量会放回队列，由下面的写入处理
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    await flush_cache_hits()
+
+
+# 会话info中记录事务提交后需要清除分析结果缓存的会话ID
+_PENDING_CACHE_EVICTIONS = "analysis_cache_evictions"
+
+# 事务提交后执行的缓存清除任务（保留引用，避免任务未完成即被回收）
+_cache_eviction_tasks: Set[asyncio.Task] = set()
+
+
+async def _evict_session_records(session_ids: Set[str]) -> None:
+    """清除会话的分析结果缓存"""
+    for session_id in session_ids:
+        try:
+            await analysis_record_cache.delete_session_records(session_id)
+        except Exception as e:
+            logger.warning(f"删除分析结果缓存失败: {str(e)}")
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_cache_evictions(session: Session) -> None:
+    """
+    事务提交后清除已删除分析结果的缓存
+
+    在提交前清除时，并发读取仍能看到未删除的记录并重新写入缓存；
+    保存点提交不触发
+    """
+    if session.in_nested_transaction():
+        return
+
+    session_ids = session.info.pop(_PENDING_CACHE_EVICTIONS, None)
+    if session_ids:
+        task = asyncio.get_running_loop().create_task(_evict_session_records(session_ids))
+        _cache_eviction_tasks.add(task)
+        task.add_done_callback(_cache_eviction_tasks.discard)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_cache_evictions(session: Session, transaction) -> None:
+    """事务回滚时记录未被删除，放弃待清除的缓存"""
+    if transaction.parent is None:
+        session.info.pop(_PENDING_CACHE_EVICTIONS, None)
+
+
+def _utcnow_like(value: datetime) -> datetime:
+    """返回与给定时间同类（带/不带时区）的当前UTC时间"""
+    if value.tzinfo is not None:
+        return datetime.now(timezone.utc)
+    return datetime.utcnow()
+
+
+def _analysis_to_record(analysis: LiteratureAnalysis) -> Dict[str, Any]:
+    """将分析结果对象序列化为可缓存的字典"""
+    record = {}
+    for name in _LITERATURE_ANALYSIS_COLUMNS:
+        value = getattr(analysis, name)
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        record[name] = value
+    return record
+
+
+def _analysis_from_record(record: Dict[str, Any]) -> LiteratureAnalysis:
+    """从缓存字典还原分析结果对象（处于detached状态）"""
+    data = dict(record)
+    data["session_id"] = uuid.UUID(data["session_id"])
+    for name in ("created_at", "expires_at"):
+        if data.get(name):
+            data[name] = datetime.fromisoformat(data[name])
+    analysis = LiteratureAnalysis(**data)
+    make_transient_to_detached(analysis)
+    return analysis
+
+
+def _analysis_key(session_id: Any, analysis_type: str, content_hash: str) -> tuple:
+    """分析结果唯一键，会话ID统一为标准UUID字符串（兼容UUID对象和大小写不同的字符串）"""
+    return (str(uuid.UUID(str(session_id))), analysis_type, content_hash)
+
 
 class AnalysisRepository:
-    """分析结果数据访问层"""
+    """
+    分析结果数据访问层
+
+    Repository方法只flush不commit，由调用方在返回响应前提交事务
+    """
 
     def __init__(self, db: AsyncSession) -> None:
         """
@@ -27,6 +299,7 @@ class AnalysisRepository:
         """
         self.db = db
 
+    @_bounded_write
     async def save_literature_analysis(
         self,
         session_id: str,
@@ -62,11 +335,7 @@ class AnalysisRepository:
         )
 
         if existing:
-            # 更新缓存命中次数
-            existing.cache_hit_count += 1
-            await self.db.commit()
-            await self.db.refresh(existing)
-            logger.info(f"更新分析结果缓存命中次数: {existing.id}")
+            await self._record_cache_hit(existing)
             return existing
 
         # 创建新的分析结果
@@ -80,19 +349,19 @@ class AnalysisRepository:
             tokens_used=tokens_used,
             model_used=model_used,
             is_cached=False,
-            expires_at=datetime.utcnow() + timedelta(hours=1)
+            expires_at=func.now() + text("interval '1 hour'")
         )
 
-        self.db.add(analysis)
-
         try:
-            await self.db.commit()
-            await self.db.refresh(analysis)
+            # 在保存点内写入，唯一约束冲突时只回滚本次插入
+            async with self.db.begin_nested():
+                self.db.add(analysis)
+            # 加载数据库生成的时间字段
+            await self.db.refresh(analysis, ["created_at", "expires_at"])
             logger.info(f"保存文科分析结果: {analysis.id}, 类型: {analysis_type}")
             return analysis
         except IntegrityError:
             # 处理并发插入导致的唯一约束冲突
-            await self.db.rollback()
             logger.info(f"检测到并发插入冲突，重新获取已存在的分析结果")
 
             # 重新查询已存在的记录
@@ -103,11 +372,7 @@ class AnalysisRepository:
             )
 
             if existing:
-                # 更新缓存命中次数
-                existing.cache_hit_count += 1
-                await self.db.commit()
-                await self.db.refresh(existing)
-                logger.info(f"更新分析结果缓存命中次数: {existing.id}")
+                await self._record_cache_hit(existing)
                 return existing
             else:
                 # 如果仍然找不到，说明可能是其他问题，重新抛出异常
@@ -130,6 +395,10 @@ class AnalysisRepository:
         Returns:
             分析结果对象或None
         """
+        cached = await self._get_cached_analysis(session_id, analysis_type, content_hash)
+        if cached is not None:
+            return cached
+
         result = await self.db.execute(
             select(LiteratureAnalysis).where(
                 and_(
@@ -138,13 +407,88 @@ class AnalysisRepository:
                     LiteratureAnalysis.content_hash == content_hash,
                     or_(
                         LiteratureAnalysis.expires_at.is_(None),
-                        LiteratureAnalysis.expires_at > datetime.utcnow()
+                        LiteratureAnalysis.expires_at > func.now()
                     )
                 )
             )
         )
 
-        return result.scalar_one_or_none()
+        analysis = result.scalar_one_or_none()
+        if analysis is not None:
+            await self._cache_analysis(analysis)
+
+        return analysis
+
+    async def _get_cached_analysis(
+        self,
+        session_id: str,
+        analysis_type: str,
+        content_hash: str
+    ) -> Optional[LiteratureAnalysis]:
+        """
+        从缓存获取分析结果，并以不查询数据库的方式关联到当前会话
+
+        Returns:
+            分析结果对象，未命中或已过期返回None
+        """
+        try:
+            record = await analysis_record_cache.get_record(
+                str(session_id), analysis_type, content_hash
+            )
+        except Exception as e:
+            logger.warning(f"获取分析结果缓存失败: {str(e)}")
+            return None
+
+        if not record:
+            return None
+
+        try:
+            analysis = _analysis_from_record(record)
+            if analysis.expires_at is not None and analysis.expires_at <= _utcnow_like(analysis.expires_at):
+                return None
+
+            return await self.db.merge(analysis, load=False)
+        except Exception as e:
+            # 缓存记录损坏或与当前模型不兼容，按未命中处理并删除该记录
+            logger.warning(f"解析分析结果缓存失败: {str(e)}")
+            try:
+                await analysis_record_cache.delete_record(
+                    str(session_id), analysis_type, content_hash
+                )
+            except Exception as delete_error:
+                logger.warning(f"删除分析结果缓存失败: {str(delete_error)}")
+            return None
+
+    async def _cache_analysis(self, analysis: LiteratureAnalysis) -> None:
+        """缓存分析结果，缓存时间不超过记录本身的过期时间"""
+        ttl = settings.analysis_record_cache_ttl
+        if analysis.expires_at is not None:
+            remaining = (analysis.expires_at - _utcnow_like(analysis.expires_at)).total_seconds()
+            if remaining < 1:
+                return
+            ttl = min(ttl, int(remaining))
+
+        try:
+            await analysis_record_cache.set_record(_analysis_to_record(analysis), ttl=ttl)
+        except Exception as e:
+            logger.warning(f"保存分析结果缓存失败: {str(e)}")
+
+    async def _record_cache_hit(self, analysis: LiteratureAnalysis) -> None:
+        """
+        记录一次缓存命中
+
+        命中次数先在内存中累积，由后台任务批量写入数据库；
+        写入任务未启动时（如脚本中使用）立即写入
+        """
+        _pending_cache_hits[analysis.id] += 1
+        _cache_hit_keys[analysis.id] = (
+            str(analysis.session_id), analysis.analysis_type, analysis.content_hash
+        )
+        set_committed_value(analysis, "cache_hit_count", (analysis.cache_hit_count or 0) + 1)
+        logger.info(f"更新分析结果缓存命中次数: {analysis.id}")
+
+        if _cache_hit_flusher_task is None:
+            await flush_cache_hits()
 
     async def get_literature_analysis_list(
         self,
@@ -175,6 +519,7 @@ class AnalysisRepository:
         result = await self.db.execute(query)
         return list(result.scalars().all())
 
+    @_bounded_write
     async def save_math_steps(
         self,
         session_id: str,
@@ -190,38 +535,48 @@ class AnalysisRepository:
             steps: 步骤列表
 
         Returns:
-            保存的步骤对象列表
-        """
-        saved_steps = []
-
-        for step_data in steps:
-            step = MathStep(
-                session_id=session_id,
-                content_version=content_version,
-                step_number=step_data.get("step_number", 0),
-                step_order=step_data.get("step_order", 0),
-                step_content=step_data.get("step_content", ""),
-                formula=step_data.get("formula"),
-                symbolic_form=step_data.get("symbolic_form"),
-                variables_before=step_data.get("variables_before"),
-                variables_after=step_data.get("variables_after"),
-                variables_introduced=step_data.get("variables_introduced"),
-                is_valid=step_data.get("is_valid"),
-                validation_details=step_data.get("validation_details"),
-                errors=step_data.get("errors"),
-                warnings=step_data.get("warnings"),
-                next_step_hint=step_data.get("next_step_hint"),
-                start_pos=step_data.get("start_pos"),
-                end_pos=step_data.get("end_pos")
-            )
-
-            self.db.add(step)
-            saved_steps.append(step)
-
-        await self.db.commit()
+            新保存的步骤对象列表，已存在的步骤不包含在内
 
-        for step in saved_steps:
-            await self.db.refresh(step)
+        Raises:
+            ValueError: 步骤缺少step_order
+        """
+        if not steps:
+            return []
+
+        # step_order 是唯一键的一部分，缺失时不能用默认值代替，否则整批步骤互相冲突
+        if any(step_data.get("step_order") is None for step_data in steps):
+            raise ValueError("数学步骤缺少step_order")
+
+        rows = [
+            {
+                "session_id": session_id,
+                "content_version": content_version,
+                "step_number": step_data.get("step_number", 0),
+                "step_order": step_data["step_order"],
+                "step_content": step_data.get("step_content", ""),
+                "formula": step_data.get("formula"),
+                "symbolic_form": step_data.get("symbolic_form"),
+                "variables_before": step_data.get("variables_before"),
+                "variables_after": step_data.get("variables_after"),
+                "variables_introduced": step_data.get("variables_introduced"),
+                "is_valid": step_data.get("is_valid"),
+                "validation_details": step_data.get("validation_details"),
+                "errors": step_data.get("errors"),
+                "warnings": step_data.get("warnings"),
+                "next_step_hint": step_data.get("next_step_hint"),
+                "start_pos": step_data.get("start_pos"),
+                "end_pos": step_data.get("end_pos")
+            }
+            for step_data in steps
+        ]
+
+        # 单次批量INSERT并通过RETURNING取回主键和默认值，无需逐个refresh；
+        # 已存在的步骤（如并发写入）直接跳过，不影响同批次其他步骤写入
+        stmt = pg_insert(MathStep).on_conflict_do_nothing(
+            index_elements=["session_id", "content_version", "step_order"]
+        ).returning(MathStep)
+        result = await self.db.scalars(stmt, rows)
+        saved_steps = list(result.all())
 
         logger.info(f"保存数学步骤: {len(saved_steps)}个, 会话: {session_id}")
 
@@ -242,16 +597,47 @@ class AnalysisRepository:
         Returns:
             步骤列表
         """
+        query = self._math_steps_query(session_id, content_version)
+
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def stream_math_steps(
+        self,
+        session_id: str,
+        content_version: Optional[int] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[MathStep]:
+        """
+        逐条获取数学步骤，按批从服务端游标读取，不一次性加载全部结果
+
+        服务端游标需要事务，不能用于只读（AUTOCOMMIT）会话
+
+        Args:
+            session_id: 会话ID
+            content_version: 内容版本（可选）
+            batch_size: 每批读取的行数
+
+        Yields:
+            步骤对象
+        """
+        query = self._math_steps_query(session_id, content_version)
+
+        result = await self.db.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for step in result:
+            yield step
+
+    @staticmethod
+    def _math_steps_query(session_id: str, content_version: Optional[int]) -> Select:
+        """构建数学步骤查询"""
         query = select(MathStep).where(MathStep.session_id == session_id)
 
         if content_version is not None:
             query = query.where(MathStep.content_version == content_version)
 
-        query = query.order_by(MathStep.step_order)
-
-        result = await self.db.execute(query)
-        return list(result.scalars().all())
+        return query.order_by(MathStep.step_order)
 
+    @_bounded_write
     async def save_logic_tree_nodes(
         self,
         session_id: str,
@@ -267,36 +653,47 @@ class AnalysisRepository:
             nodes: 节点列表
 
         Returns:
-            保存的节点对象列表
-        """
-        saved_nodes = []
+            新保存的节点对象列表，已存在的节点不包含在内
 
-        for node_data in nodes:
-            node = LogicTreeNode(
-                session_id=session_id,
-                content_version=content_version,
-                node_id=node_data.get("node_id", ""),
-                node_type=node_data.get("node_type", "intermediate"),
-                content=node_data.get("content", ""),
-                symbolic_form=node_data.get("symbolic_form"),
-                description=node_data.get("description"),
-                level=node_data.get("level", 0),
-                position=node_data.get("position"),
-                depends_on=node_data.get("depends_on"),
-                required_by=node_data.get("required_by"),
-                status=node_data.get("status", "incomplete"),
-                completion_percentage=node_data.get("completion_percentage"),
-                reasoning=node_data.get("reasoning"),
-                formula_used=node_data.get("formula_used")
-            )
-
-            self.db.add(node)
-            saved_nodes.append(node)
-
-        await self.db.commit()
-
-        for node in saved_nodes:
-            await self.db.refresh(node)
+        Raises:
+            ValueError: 节点缺少节点ID
+        """
+        if not nodes:
+            return []
+
+        # 逻辑树Agent输出的字段为 id/type/symbolic，兼容 node_id/node_type/symbolic_form
+        node_ids = [node_data.get("node_id") or node_data.get("id") for node_data in nodes]
+        if not all(node_ids):
+            raise ValueError("逻辑树节点缺少节点ID")
+
+        rows = [
+            {
+                "session_id": session_id,
+                "content_version": content_version,
+                "node_id": node_id,
+                "node_type": node_data.get("node_type") or node_data.get("type") or "intermediate",
+                "content": node_data.get("content", ""),
+                "symbolic_form": node_data.get("symbolic_form") or node_data.get("symbolic"),
+                "description": node_data.get("description"),
+                "level": node_data.get("level", 0),
+                "position": node_data.get("position"),
+                "depends_on": node_data.get("depends_on"),
+                "required_by": node_data.get("required_by"),
+                "status": node_data.get("status", "incomplete"),
+                "completion_percentage": node_data.get("completion_percentage"),
+                "reasoning": node_data.get("reasoning"),
+                "formula_used": node_data.get("formula_used")
+            }
+            for node_id, node_data in zip(node_ids, nodes)
+        ]
+
+        # 单次批量INSERT并通过RETURNING取回主键和默认值，无需逐个refresh；
+        # 已存在的节点（如并发写入）直接跳过，不影响同批次其他节点写入
+        stmt = pg_insert(LogicTreeNode).on_conflict_do_nothing(
+            index_elements=["session_id", "content_version", "node_id"]
+        ).returning(LogicTreeNode)
+        result = await self.db.scalars(stmt, rows)
+        saved_nodes = list(result.all())
 
         logger.info(f"保存逻辑树节点: {len(saved_nodes)}个, 会话: {session_id}")
 
@@ -317,16 +714,103 @@ class AnalysisRepository:
         Returns:
             节点列表
         """
+        query = self._logic_tree_nodes_query(session_id, content_version)
+
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def stream_logic_tree_nodes(
+        self,
+        session_id: str,
+        content_version: Optional[int] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[LogicTreeNode]:
+        """
+        逐条获取逻辑树节点，按批从服务端游标读取，不一次性加载全部结果
+
+        服务端游标需要事务，不能用于只读（AUTOCOMMIT）会话
+
+        Args:
+            session_id: 会话ID
+            content_version: 内容版本（可选）
+            batch_size: 每批读取的行数
+
+        Yields:
+            节点对象
+        """
+        query = self._logic_tree_nodes_query(session_id, content_version)
+
+        result = await self.db.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for node in result:
+            yield node
+
+    @staticmethod
+    def _logic_tree_nodes_query(session_id: str, content_version: Optional[int]) -> Select:
+        """构建逻辑树节点查询"""
         query = select(LogicTreeNode).where(LogicTreeNode.session_id == session_id)
 
         if content_version is not None:
             query = query.where(LogicTreeNode.content_version == content_version)
 
-        query = query.order_by(LogicTreeNode.level, LogicTreeNode.id)
+        return query.order_by(LogicTreeNode.level, LogicTreeNode.id)
 
-        result = await self.db.execute(query)
-        return list(result.scalars().all())
+    async def next_math_steps_version(self, session_id: str) -> int:
+        """
+        分配会话下一次保存数学步骤使用的内容版本
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            内容版本
+        """
+        return await self._next_content_version(MathStep, session_id)
+
+    async def next_logic_tree_version(self, session_id: str) -> int:
+        """
+        分配会话下一次保存逻辑树使用的内容版本
+
+        Args:
+            session_id: 会话ID
 
+        Returns:
+            内容版本
+        """
+        return await self._next_content_version(LogicTreeNode, session_id)
+
+    async def get_latest_logic_tree_version(self, session_id: str) -> Optional[int]:
+        """
+        获取会话最新逻辑树的内容版本
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            内容版本，没有逻辑树时返回None
+        """
+        return await self._latest_content_version(LogicTreeNode, session_id)
+
+    async def _latest_content_version(self, model, session_id: str) -> Optional[int]:
+        """获取会话已保存的最大内容版本"""
+        result = await self.db.execute(
+            select(func.max(model.content_version)).where(model.session_id == session_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def _next_content_version(self, model, session_id: str) -> int:
+        """
+        分配会话的下一个内容版本
+
+        先获取事务级咨询锁，同一会话的版本分配串行执行直到事务结束，
+        并发请求不会分到同一版本而互相跳过对方写入的记录
+        """
+        lock_key = f"{model.__tablename__}:{session_id}"
+        await self.db.execute(select(func.pg_advisory_xact_lock(func.hashtext(lock_key))))
+
+        latest = await self._latest_content_version(model, session_id)
+        return (latest or 0) + 1
+
+    @_bounded_write
     async def batch_create_literature_analyses(
         self,
         analyses: List[Dict[str, Any]]
@@ -340,42 +824,89 @@ class AnalysisRepository:
         Returns:
             创建的分析对象列表
         """
-        try:
-            analysis_objects = []
-
-            for analysis_data in analyses:
-                # 先检查是否已存在
-                existing = await self.get_literature_analysis_by_hash(
-                    session_id=analysis_data["session_id"],
-                    analysis_type=analysis_data["analysis_type"],
-                    content_hash=analysis_data["content_hash"]
-                )
+        if not analyses:
+            return []
 
+        try:
+            # 一次查询取出所有已存在的分析结果
+            input_keys = [
+                _analysis_key(a["session_id"], a["analysis_type"], a["content_hash"])
+                for a in analyses
+            ]
+            cache_keys = [
+                (uuid.UUID(session_id), analysis_type, content_hash)
+                for session_id, analysis_type, content_hash in set(input_keys)
+            ]
+            result = await self.db.execute(
+                select(LiteratureAnalysis).where(
+                    and_(
+                        tuple_(
+                            LiteratureAnalysis.session_id,
+                            LiteratureAnalysis.analysis_type,
+                            LiteratureAnalysis.content_hash
+                        ).in_(cache_keys),
+                        or_(
+                            LiteratureAnalysis.expires_at.is_(None),
+                            LiteratureAnalysis.expires_at > func.now()
+                        )
+                    )
+                ).execution_options(populate_existing=True)
+            )
+            existing_map = {
+                _analysis_key(a.session_id, a.analysis_type, a.content_hash): a
+                for a in result.scalars().all()
+            }
+
+            # 同一批次内的重复项只插入一次，避免 ON CONFLICT 重复更新同一行
+            new_rows: Dict[tuple, Dict[str, Any]] = {}
+            for key, analysis_data in zip(input_keys, analyses):
+                existing = existing_map.get(key)
                 if existing:
-                    # 如果已存在，更新缓存命中次数
-                    existing.cache_hit_count += 1
-                    analysis_objects.append(existing)
+                    # 如果已存在，记录一次缓存命中（增量写入，不覆盖并发写入的命中次数）
+                    await self._record_cache_hit(existing)
                     logger.info(f"批量创建时发现已存在的分析结果: {existing.id}")
-                else:
-                    # 创建新的分析结果
-                    analysis = LiteratureAnalysis(
-                        session_id=analysis_data["session_id"],
-                        analysis_type=analysis_data["analysis_type"],
-                        content_version=analysis_data["content_version"],
-                        content_hash=analysis_data["content_hash"],
-                        results=analysis_data["results"],
-                        processing_time_ms=analysis_data.get("processing_time_ms"),
-                        tokens_used=analysis_data.get("tokens_used"),
-                        model_used=analysis_data.get("model_used"),
-                        is_cached=False
-                    )
-                    analysis_objects.append(analysis)
-                    self.db.add(analysis)
-
-            await self.db.commit()
+                elif key not in new_rows:
+                    new_rows[key] = {
+                        "session_id": analysis_data["session_id"],
+                        "analysis_type": analysis_data["analysis_type"],
+                        "content_version": analysis_data["content_version"],
+                        "content_hash": analysis_data["content_hash"],
+                        "results": analysis_data["results"],
+                        "processing_time_ms": analysis_data.get("processing_time_ms"),
+                        "tokens_used": analysis_data.get("tokens_used"),
+                        "model_used": analysis_data.get("model_used"),
+                        "is_cached": False,
+                        "cache_hit_count": 0
+                    }
+
+            if new_rows:
+                # 单条 INSERT ... ON CONFLICT 写入剩余记录：
+                # 冲突行已过期时用新结果替换，否则视为并发插入，累加命中次数
+                stmt = pg_insert(LiteratureAnalysis).values(list(new_rows.values()))
+                table = LiteratureAnalysis.__table__
+                expired = and_(table.c.expires_at.is_not(None), table.c.expires_at <= func.now())
+                set_ = {
+                    name: case((expired, stmt.excluded[name]), else_=table.c[name])
+                    for name in _REFRESHED_ON_EXPIRY
+                }
+                set_["cache_hit_count"] = case(
+                    (expired, stmt.excluded.cache_hit_count),
+                    else_=table.c.cache_hit_count + 1
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["session_id", "analysis_type", "content_hash"],
+                    set_=set_
+                ).returning(LiteratureAnalysis)
+                inserted = await self.db.scalars(
+                    stmt,
+                    execution_options={"populate_existing": True}
+                )
+                for analysis in inserted.all():
+                    key = _analysis_key(analysis.session_id, analysis.analysis_type, analysis.content_hash)
+                    existing_map[key] = analysis
 
-            for analysis in analysis_objects:
-                await self.db.refresh(analysis)
+            # 按输入顺序返回，重复的输入项对应同一对象
+            analysis_objects = [existing_map[key] for key in input_keys]
 
             logger.info(f"批量创建文科分析结果: {len(analysis_objects)} 个")
 
@@ -383,13 +914,12 @@ class AnalysisRepository:
 
         except IntegrityError as e:
             logger.error(f"批量创建文科分析结果时发生唯一约束冲突: {str(e)}")
-            await self.db.rollback()
             raise
         except Exception as e:
             logger.error(f"批量创建文科分析结果失败: {str(e)}")
-            await self.db.rollback()
             raise
 
+    @_bounded_write
     async def batch_delete_analyses(
         self,
         session_id: str,
@@ -423,7 +953,8 @@ class AnalysisRepository:
             result = await self.db.execute(stmt)
             deleted_count = result.rowcount
 
-            await self.db.commit()
+            # 删除提交后再清除缓存
+            self.db.info.setdefault(_PENDING_CACHE_EVICTIONS, set()).add(str(session_id))
 
             logger.info(f"批量删除分析结果: {deleted_count} 个")
 
@@ -431,9 +962,9 @@ class AnalysisRepository:
 
         except Exception as e:
             logger.error(f"批量删除分析结果失败: {str(e)}")
-            await self.db.rollback()
             raise
 
+    @_bounded_write
     async def batch_update_math_steps(
         self,
         step_updates: List[Dict[str, Any]]
@@ -447,23 +978,40 @@ class AnalysisRepository:
         Returns:
             更新的步骤数量
         """
-        try:
-            updated_count = 0
+        if not step_updates:
+            return 0
 
-            for update_data in step_updates:
-                step_id = update_data.pop("step_id")
+        try:
+            columns = set(MathStep.__table__.columns.keys())
 
-                stmt = select(MathStep).where(MathStep.id == step_id)
-                result = await self.db.execute(stmt)
-                step = result.scalar_one_or_none()
+            # 一次查询确认存在的步骤ID，不存在的更新项直接跳过
+            step_ids = [update_data["step_id"] for update_data in step_updates]
+            result = await self.db.execute(
+                select(MathStep.id).where(MathStep.id.in_(step_ids))
+            )
+            existing_ids = set(result.scalars().all())
 
-                if step:
-                    for key, value in update_data.items():
-                        if hasattr(step, key):
-                            setattr(step, key, value)
-                    updated_count += 1
+            # 按更新字段集合分组，每组发出一条按主键的批量UPDATE
+            buckets: Dict[frozenset, List[Dict[str, Any]]] = {}
+            for update_data in step_updates:
+                if update_data["step_id"] not in existing_ids:
+                    continue
+                row = {
+                    key: value for key, value in update_data.items()
+                    if key in columns and key != "id"
+                }
+                row["id"] = update_data["step_id"]
+                buckets.setdefault(frozenset(row), []).append(row)
 
-            await self.db.commit()
+            updated_count = 0
+            for rows in buckets.values():
+                if len(rows[0]) > 1:
+                    await self.db.execute(
+                        update(MathStep),
+                        rows,
+                        execution_options={"synchronize_session": False}
+                    )
+                updated_count += len(rows)
 
             logger.info(f"批量更新数学步骤: {updated_count} 个")
 
@@ -471,9 +1019,9 @@ class AnalysisRepository:
 
         except Exception as e:
             logger.error(f"批量更新数学步骤失败: {str(e)}")
-            await self.db.rollback()
             raise
 
+    @_bounded_write
     async def save_debug_session(
         self,
         session_id: str,
@@ -515,8 +1063,7 @@ class AnalysisRepository:
             )
 
             self.db.add(debug_session)
-            await self.db.commit()
-            await self.db.refresh(debug_session)
+            await self.db.flush()
 
             logger.info(f"保存调试会话: {debug_session.id}, 会话: {session_id}")
 
@@ -524,7 +1071,6 @@ class AnalysisRepository:
 
         except Exception as e:
             logger.error(f"保存调试会话失败: {str(e)}")
-            await self.db.rollback()
             raise
 
     async def get_debug_sessions(
@@ -548,3 +1094,36 @@ class AnalysisRepository:
 
         result = await self.db.execute(query)
         return list(result.scalars().all())
+
+    async def gather_writes(
+        self,
+        builders: List[Callable[[AsyncSession], Awaitable[Any]]]
+    ) -> List[Any]:
+        """
+        并发执行多组相互独立的写操作，每组使用独立的会话并各自提交
+
+        各组写操作必须作用于互不重叠的数据行（如不同的session_id），
+        否则并发事务之间可能相互等待行锁甚至死锁。
+        各组分别提交，任一组失败不会回滚其他已提交的组。
+        每个会话在事务结束前占用一个写操作名额，并发数受写操作信号量限制；
+        调用前应先提交调用方会话的写操作，避免同时占用两个名额。
+
+        Args:
+            builders: 写操作列表，每项接收一个新会话并执行写入
+
+        Returns:
+            各写操作的返回值，顺序与输入一致
+        """
+        factory = get_session_factory()
+
+        async def _run(builder: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+            async with factory() as session:
+                await _acquire_write_slot(session)
+                try:
+                    result = await builder(session)
+                    await session.commit()
+                    return result
+                finally:
+                    _release_write_slot(session.sync_session)
+
+        return list(await asyncio.gather(*(_run(builder) for builder in builders)))
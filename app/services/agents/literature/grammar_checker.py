@@ -3,13 +3,120 @@
 使用Chain of Thought模式进行语法检查
 """
 
-import json
-from typing import Any, Dict, List
+import re
+from functools import lru_cache
+from secrets import token_hex
+from typing import Any, Dict, List, Tuple
 
+import orjson
+
+from app.config import settings
 from app.services.agents.base import BaseAgent, AgentConfig
 from app.services.llm.model_router import TaskType
 from app.services.llm.prompt_manager import prompt_manager
 
+# 匹配响应中```json ... ```（或无语言标记）代码块内的JSON对象
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+# 用户提示词中与输入内容无关的固定部分
+_PROMPT_TAIL = """### 检查要求
+1. 使用Chain of Thought方式逐步思考
+2. 对每个问题评估置信度（0-1）
+3. 只输出置信度 ≥ 0.7 的错误
+4. 解释要简单易懂，适合学生理解
+
+### 输出格式
+请严格按照以下JSON格式返回结果：
+```json
+{
+  "errors": [
+    {
+      "type": "错误类型(typo/grammar/syntax/style)",
+      "severity": "严重程度(low/medium/high)",
+      "start_pos": 起始位置(整数),
+      "end_pos": 结束位置(整数),
+      "line_number": 行号(整数),
+      "original_text": "原文本",
+      "suggestion": "建议修改",
+      "explanation": "错误说明",
+      "confidence": 置信度(0-1的浮点数)
+    }
+  ],
+  "summary": {
+    "total_errors": 总错误数,
+    "by_type": {
+      "typo": 错别字数量,
+      "grammar": 语法错误数量,
+      "syntax": 病句数量,
+      "style": 风格问题数量
+    }
+  }
+}
+```
+
+请开始检查。
+"""
+
+
+# 检查类型对应的中文说明
+_CHECK_TYPE_LABELS: Dict[str, str] = {
+    "typo": "错别字",
+    "grammar": "语法错误",
+    "syntax": "病句",
+    "style": "表达风格"
+}
+
+
+@lru_cache(maxsize=32)
+def _render_check_focus(check_types: Tuple[str, ...]) -> str:
+    """
+    构建检查重点说明
+
+    Args:
+        check_types: 检查类型
+
+    Returns:
+        以顿号分隔的检查类型中文说明，未知类型保留原文
+    """
+    return "、".join(_CHECK_TYPE_LABELS.get(t, t) for t in check_types)
+
+
+@lru_cache(maxsize=64)
+def _build_prompt_frame(
+    grade_level: str,
+    language: str,
+    check_types: Tuple[str, ...]
+) -> Tuple[str, str]:
+    """
+    构建用户提示词中作文内容前后的部分
+
+    年级、语言和检查类型的组合很少，结果按参数缓存
+
+    Args:
+        grade_level: 年级水平
+        language: 语言
+        check_types: 检查类型
+
+    Returns:
+        (作文内容之前的部分, 作文内容之后的部分)
+    """
+    check_focus = _render_check_focus(check_types)
+
+    head = f"""## 当前任务
+请检查以下{grade_level}年级学生的作文：
+
+### 作文内容
+"""
+
+    focus = f"""### 检查重点
+{check_focus}
+
+### 语言
+{language}
+
+"""
+    return head, focus
+
 
 class GrammarCheckerAgent(BaseAgent):
     """
@@ -64,29 +171,15 @@ class GrammarCheckerAgent(BaseAgent):
         check_types = kwargs.get("check_types", ["typo", "grammar", "syntax", "style"])
         context = kwargs.get("context") or {}  # 确保context不是None
 
-        # 构建检查重点说明
-        check_focus = "、".join({
-            "typo": "错别字",
-            "grammar": "语法错误",
-            "syntax": "病句",
-            "style": "表达风格"
-        }.get(t, t) for t in check_types)
-
-        prompt = f"""## 当前任务
-请检查以下{self.grade_level}年级学生的作文：
+        prompt_head, prompt_focus = _build_prompt_frame(
+            self.grade_level, language, tuple(check_types)
+        )
 
-### 作文内容
-```
+        prompt = f"""{prompt_head}```
 {content}
 ```
 
-### 检查重点
-{check_focus}
-
-### 语言
-{language}
-
-"""
+{prompt_focus}"""
 
         # 如果有上下文信息，添加光标位置
         if context.get("cursor_position"):
@@ -97,43 +190,7 @@ class GrammarCheckerAgent(BaseAgent):
 
 """
 
-        prompt += """### 检查要求
-1. 使用Chain of Thought方式逐步思考
-2. 对每个问题评估置信度（0-1）
-3. 只输出置信度 ≥ 0.7 的错误
-4. 解释要简单易懂，适合学生理解
-
-### 输出格式
-请严格按照以下JSON格式返回结果：
-```json
-{
-  "errors": [
-    {
-      "type": "错误类型(typo/grammar/syntax/style)",
-      "severity": "严重程度(low/medium/high)",
-      "start_pos": 起始位置(整数),
-      "end_pos": 结束位置(整数),
-      "line_number": 行号(整数),
-      "original_text": "原文本",
-      "suggestion": "建议修改",
-      "explanation": "错误说明",
-      "confidence": 置信度(0-1的浮点数)
-    }
-  ],
-  "summary": {
-    "total_errors": 总错误数,
-    "by_type": {
-      "typo": 错别字数量,
-      "grammar": 语法错误数量,
-      "syntax": 病句数量,
-      "style": 风格问题数量
-    }
-  }
-}
-```
-
-请开始检查。
-"""
+        prompt += _PROMPT_TAIL
         return prompt
 
     def parse_response(self, response: str) -> Dict[str, Any]:
@@ -148,22 +205,13 @@ class GrammarCheckerAgent(BaseAgent):
         Returns:
             解析后的结构化数据
         """
-        try:
-            # 尝试提取JSON内容
-            response = response.strip()
-
-            # 如果响应包含```json标记，提取其中的JSON
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
+        # 提取```json代码块中的JSON，没有代码块时直接解析整个响应
+        match = _JSON_FENCE.search(response)
+        payload = match.group(1) if match else response.strip()
 
+        try:
             # 解析JSON
-            result = json.loads(response)
+            result = orjson.loads(payload)
 
             # 验证必需字段
             if "errors" not in result:
@@ -176,11 +224,10 @@ class GrammarCheckerAgent(BaseAgent):
                 }
 
             # 确保每个错误都有必需字段，并生成唯一ID
-            import uuid
             for i, error in enumerate(result["errors"]):
                 # 生成唯一ID（如果没有）
                 if "id" not in error:
-                    error["id"] = f"err_{uuid.uuid4().hex[:8]}_{i}"
+                    error["id"] = f"err_{token_hex(4)}_{i}"
 
                 if "type" not in error:
                     error["type"] = "unknown"
@@ -191,8 +238,8 @@ class GrammarCheckerAgent(BaseAgent):
 
             return result
 
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON解析失败: {str(e)}, 响应: {response[:200]}")
+        except orjson.JSONDecodeError as e:
+            self.logger.error(f"JSON解析失败: {str(e)}, 响应: {payload[:200]}")
             # 返回空结果
             return {
                 "errors": [],
@@ -220,9 +267,15 @@ class GrammarCheckerAgent(BaseAgent):
         if not isinstance(content, str):
             raise ValueError("content必须是字符串类型")
 
-        # 检查内容长度
-        if len(content) > 50000:
-            raise ValueError(f"内容过长，最大支持50000字符，当前{len(content)}字符")
+        # 检查内容长度：先用对象内存占用做粗略判断（每字符最多4字节，另留出对象头部开销），
+        # 明显超长时直接拒绝
+        max_chars = settings.max_content_chars
+        if content.__sizeof__() > max_chars * 4 + 128:
+            raise ValueError(f"内容过长，最大支持{max_chars}字符")
+
+        content_length = len(content)
+        if content_length > max_chars:
+            raise ValueError(f"内容过长，最大支持{max_chars}字符，当前{content_length}字符")
 
         # 验证语言参数
         language = kwargs.get("language", "zh")
@@ -6,6 +6,7 @@
 import re
 from typing import Dict, Any, Optional
 
+from app.config import settings
 from app.core.logging import get_logger
 from app.core.exceptions import InvalidModeException
 from app.services.llm.qwen_client import qwen_client
@@ -56,7 +57,7 @@ class ModeDispatcher:
                 "Ctrl+H": "health_score"
             },
             "limits": {
-                "max_content_length": 50000,
+                "max_content_length": settings.max_content_chars,
                 "max_polish_length": 5000
             }
         }